@@ -6,10 +6,17 @@ from collections import OrderedDict
 
 from psfreader.psfdata import TypeId, ChunkId, ElementId, \
                               SectionId, SectionInfo, PropertyTypeId, \
-                              PSF_Property, PSF_Type, PSF_Variable, PSF_Group  
+                              PSF_Property, PSF_Type, PSF_Variable, PSF_Group, \
+                              PSFReaderError
+from psfreader.measure import measure, Min, Max, Average, RMS, Integral, Crossing
+from psfreader import expr
+from psfreader.resample import resample
+from psfreader.diff import compare, DiffResult
+from psfreader.shm import publish, SharedPSFHandle
 
-class PSFReaderError(ValueError):
-    pass
+__all__ = ['PSFReader', 'PSFFile', 'PSFReaderError',
+           'measure', 'Min', 'Max', 'Average', 'RMS', 'Integral', 'Crossing',
+           'expr', 'resample', 'compare', 'DiffResult', 'publish', 'SharedPSFHandle']
 
 
 class PSFFile:
@@ -142,9 +149,12 @@ class PSFFile:
     # =============================================================================
     # parsing of PSF structure
     # =============================================================================
-    def read_file(self, header_only=False):
+    def read_file(self, header_only=False, lazy=False):
         '''
         Read whole PSF file and convert to internal format
+
+            when lazy is True the swept data in the VALUE section is not loaded,
+            use iter_value_windows() to stream it.
         '''
 
         self.completed = True
@@ -194,7 +204,7 @@ class PSFFile:
                 self.read_section_TRACE()
 
             elif section_id == SectionId.VALUE:
-                self.read_section_VALUE()
+                self.read_section_VALUE(lazy=lazy)
             else:
                 self.value = None
 
@@ -252,7 +262,7 @@ class PSFFile:
                 if valid:
                     self.traces[var.name] = var        
 
-    def read_section_VALUE(self):
+    def read_section_VALUE(self, lazy=False):
         endsub = self.read_chunk_preamble(ChunkId.MAJOR_SECTION) 
         c_id = self.read_uint32()
         if c_id == ChunkId.MINOR_SECTION:
@@ -269,6 +279,12 @@ class PSFFile:
                 else:
                     break
 
+        elif len(self.sweep_vars) == 1 and lazy:
+            # only determine the record layout, the data is streamed on demand
+            self.sweep_vars[0].to_npdtype(self)
+            for trace in self.traces.values():
+                trace.to_npdtype(self)
+
         elif len(self.sweep_vars) == 1:  # sweep specified
             npoints = self.properties['PSF sweep points']
             sweep_var = self.sweep_vars[0]
@@ -338,20 +354,161 @@ class PSFFile:
 
     def read_section_VALUE_sweep(self):
         '''read the data of the VALUE section in case a sweep is specified'''
-                       
+
+
+    # =============================================================================
+    # streaming access to the VALUE section
+    # =============================================================================
+    def iter_value_windows(self, names=None, chunk_size=65536):
+        '''
+        Stream the swept data of the VALUE section.
+
+            yields tuples (start, sweep, values), with sweep the sweep values of
+            points start:start+len(sweep) and values an OrderedDict {name: array}
+            for the traces in names (default: all traces).
+            Traces that are not requested are skipped, not decoded. Windows are
+            coalesced into chunks of (at least) chunk_size points, so memory use
+            is bounded by chunk_size and the number of requested traces.
+            The file is (re)opened for every iteration, several iterators can
+            run concurrently.'''
+        if len(self.sweep_vars) != 1:
+            raise PSFReaderError('Streaming requires a file with exactly one sweep variable.')
+        sweep_var = self.sweep_vars[0]
+        if names is None:
+            names = list(self.traces)
+        for name in names:
+            if name not in self.traces:
+                raise PSFReaderError('Unknown signal: ' + repr(name))
+
+        if sweep_var.val is not None: # data is already in memory
+            npoints = len(sweep_var.val)
+            for start in range(0, npoints, chunk_size):
+                stop = start + chunk_size
+                values = OrderedDict((name, self.traces[name].val[start:stop]) for name in names)
+                yield start, sweep_var.val[start:stop], values
+            return
+
+        win_size = self.properties.get('PSF window size', 0)
+        with open(self.filename, 'rb') as fp:
+            fp.seek(self.sections[SectionId.VALUE].offset, io.SEEK_SET)
+            c_id = struct.unpack('>2I', fp.read(8))[0] # chunk id, section end
+            if c_id != ChunkId.MAJOR_SECTION:
+                raise PSFReaderError('Unexpected ChunkId. Expected: ' + repr(ChunkId.MAJOR_SECTION) + ', Actually: ' + hex(c_id))
+            c_id = struct.unpack('>I', fp.read(4))[0]
+            if c_id == ChunkId.MINOR_SECTION:
+                fp.read(4)
+            else:
+                fp.seek(-4, io.SEEK_CUR)
+
+            if win_size > 0:
+                chunks = self._iter_windowed(fp, win_size, names)
+            else:
+                chunks = self._iter_records(fp, names, chunk_size)
+
+            # coalesce (small) windows into chunks of chunk_size points
+            start = 0
+            buffered = 0
+            buf_sweep = []
+            buf_values = OrderedDict((name, []) for name in names)
+            for sweep, values in chunks:
+                buf_sweep.append(sweep)
+                for name in names:
+                    buf_values[name].append(values[name])
+                buffered += len(sweep)
+                if buffered >= chunk_size:
+                    yield start, _native(buf_sweep), OrderedDict((name, _native(v)) for name, v in buf_values.items())
+                    start += buffered
+                    buffered = 0
+                    buf_sweep = []
+                    buf_values = OrderedDict((name, []) for name in names)
+            if buffered:
+                yield start, _native(buf_sweep), OrderedDict((name, _native(v)) for name, v in buf_values.items())
+
+    def _iter_windowed(self, fp, win_size, names):
+        '''yield (sweep, {name: values}) per DATA window (big endian views)
+
+            every window holds the sweep and then all traces, each padded to win_size
+            (see read_section_VALUE), so a trace can be located without decoding the others'''
+        npoints = self.properties['PSF sweep points']
+        sweep_var = self.sweep_vars[0]
+        traces = list(self.traces.values())
+        positions = {trace.name: k for k, trace in enumerate(traces)}
+        sweep_dt = _big_endian(sweep_var)
+        selected = [(name, positions[name], self.traces[name].record_size, _big_endian(self.traces[name])) for name in names]
+        read_points = 0
+        while read_points < npoints:
+            block_id = struct.unpack('>I', fp.read(4))[0]
+            if block_id == ElementId.DATA:
+                nb_of_datapoints = struct.unpack('>I', fp.read(4))[0] & 0x0000ffff
+                pos = fp.tell()
+                sweep = np.frombuffer(fp.read(sweep_var.record_size * nb_of_datapoints), sweep_dt)
+                values = dict()
+                for name, k, record_size, dt in selected:
+                    fp.seek(pos + (k + 1) * win_size, io.SEEK_SET)
+                    values[name] = np.frombuffer(fp.read(record_size * nb_of_datapoints), dt)
+                if traces: # no padding after the last trace
+                    fp.seek(pos + len(traces) * win_size + traces[-1].record_size * nb_of_datapoints, io.SEEK_SET)
+                else:
+                    fp.seek(pos + sweep_var.record_size * nb_of_datapoints, io.SEEK_SET)
+                read_points += nb_of_datapoints
+                yield sweep, values
+            elif block_id == ElementId.ZEROPAD:
+                pad_size = struct.unpack('>I', fp.read(4))[0]
+                fp.seek(pad_size, io.SEEK_CUR)
+            else:
+                raise PSFReaderError('Unexpected data id: ' + str(block_id))
+
+    def _iter_records(self, fp, names, chunk_size):
+        '''yield (sweep, {name: values}) for non-windowed files (big endian views)
+
+            each point is stored as DATA, var_id, [binary data] for the sweep and then
+            for every trace, i.e. a fixed size row that maps onto a structured dtype'''
+        npoints = self.properties['PSF sweep points']
+        variables = [self.sweep_vars[0]] + list(self.traces.values())
+        row_names, formats, offsets = [], [], []
+        pos = 0
+        for k, var in enumerate(variables):
+            row_names += ['_elem{}'.format(k), '_id{}'.format(k), 'v{}'.format(k)]
+            formats += ['>u4', '>u4', _big_endian(var)]
+            offsets += [pos, pos + 4, pos + 8]
+            pos += 8 + var.record_size
+        row_dt = np.dtype(dict(names=row_names, formats=formats, offsets=offsets, itemsize=pos))
+        columns = {var.name: 'v{}'.format(k) for k, var in enumerate(variables[1:], 1)}
+        elem_fields = ['_elem{}'.format(k) for k in range(len(variables))]
+        read_points = 0
+        while read_points < npoints:
+            nb_of_datapoints = min(chunk_size, npoints - read_points)
+            rows = np.frombuffer(fp.read(pos * nb_of_datapoints), row_dt)
+            for field in elem_fields:
+                if np.any(rows[field] != ElementId.DATA):
+                    raise PSFReaderError('Unexpected data id in VALUE section')
+            read_points += nb_of_datapoints
+            yield rows['v0'], {name: rows[columns[name]] for name in names}
 
     def skip_to_pos(self, pos):
         self.fp.seek(pos, io.SEEK_SET)
 
+
+def _big_endian(var):
+    '''dtype of the on-disk (big endian) representation of var'''
+    return np.dtype(var.npdtype).newbyteorder('>')
+
+
+def _native(arrays):
+    '''concatenate list of (big endian) arrays into a native byte order array'''
+    a = arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+    return a.astype(a.dtype.newbyteorder('='))
+
+
  
 class PSFReader:
     '''
     Parameter-Storage Format Reader for python.
     '''
 
-    def __init__(self, filename, header_only=False):
+    def __init__(self, filename, header_only=False, lazy=False):
         self.psf = PSFFile(filename)
-        self.psf.read_file(header_only=header_only)
+        self.psf.read_file(header_only=header_only, lazy=lazy)
         self.get_signals() 
 
     def get_header(self):
@@ -383,5 +540,22 @@ class PSFReader:
         '''Return the value of the sweep variable'''
         return self.psf.sweep_vars[0] if len(self.psf.sweep_vars) ==1 else None
 
+    def iter_windows(self, signals=None, chunk_size=65536):
+        '''Stream (start, sweep, {name: values}) chunks, see PSFFile.iter_value_windows'''
+        return self.psf.iter_value_windows(signals, chunk_size)
+
+    def measure(self, measurements, chunk_size=65536):
+        '''Evaluate measurements (list or dict, see psfreader.measure) in one pass over the data'''
+        return measure(self, measurements, chunk_size)
+
+    def evaluate(self, expression, chunk_size=65536, cache=expr.cache):
+        '''Evaluate a derived signal expression, e.g. 'db20(v(out)/v(in))' (see psfreader.expr)'''
+        return expr.evaluate(self, expression, chunk_size, cache)
 
+    def resample(self, grid, signals=None, method='linear', chunk_size=None):
+        '''Resample signals onto grid, method 'linear' or 'hold' (see psfreader.resample)'''
+        return resample(self, grid, signals, method, chunk_size)
 
+    def share(self, signals=None, name=None):
+        '''Publish signals in shared memory, returns a SharedPublication (see psfreader.shm)'''
+        return publish(self, signals, name)
@@ -0,0 +1,232 @@
+'''
+Regression diff between two PSF results.
+
+    Both files are streamed (see PSFReader.iter_windows); the golden data is
+    linearly interpolated onto the sweep points of the new data, so the files do
+    not need identical timesteps. A window of the golden data is kept just large
+    enough to cover the current chunk of the new data, memory use is bounded by
+    chunk_size. All signals are compared at once per chunk, a signal that fails
+    is no longer checked and the pass stops when no signals are left to check.
+
+    A point violates the tolerance when |new - golden| > abstol + reltol * |golden|
+    or when either value is NaN. Sweeps that do not cover the same range are
+    reported as a range mismatch.
+
+    usage:
+        from psfreader import PSFReader, compare
+
+        golden = PSFReader('golden.tran', lazy=True)
+        new = PSFReader('new.tran', lazy=True)
+        result = compare(golden, new, abstol=1e-6, reltol=1e-3)
+        failed = [r for r in result.values() if r.passed is False]
+        unchecked = [r for r in result.values() if r.passed is None] # fail_fast
+'''
+from collections import OrderedDict
+import numpy as np
+
+from psfreader.psfdata import PSFReaderError
+from psfreader.resample import interp_weights
+
+
+class DiffResult:
+    '''
+    outcome of the comparison of one signal
+
+        max_abs, max_rel: largest absolute / relative error seen (up to the first
+        violation when the signal failed). Where the golden value is 0 the relative
+        error is inf (0 when new is 0 too). NaN points are violations and are not
+        included in max_abs / max_rel.
+        violation: sweep value of the first violation (None if there is none),
+        index: its point index in the new data.
+        range_mismatch: the sweeps of golden and new do not start and end at the
+        same value (e.g. an aborted simulation), only the overlap is compared.
+        complete: all points of the overlap were compared (False when the
+        comparison was stopped early by fail_fast).
+
+        passed is False on a violation or a range mismatch, None when the
+        comparison was not complete and True otherwise.
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.max_abs = 0.0
+        self.max_rel = 0.0
+        self.violation = None
+        self.index = None
+        self.range_mismatch = False
+        self.complete = False
+
+    @property
+    def passed(self):
+        if self.violation is not None or self.range_mismatch:
+            return False
+        if not self.complete:
+            return None
+        return True
+
+    def __repr__(self):
+        attrs = 'name passed max_abs max_rel violation range_mismatch complete'
+        r = ['{}: {}'.format(repr(k), repr(getattr(self, k))) for k in attrs.split()]
+        return 'DiffResult({})'.format(', '.join(r))
+
+
+def _block(values, names):
+    '''stack the chunks of names into one 2D array'''
+    for name in names:
+        if values[name].dtype.names:
+            raise ValueError('Cannot compare STRUCT signal ' + repr(name))
+    return np.array([values[name] for name in names])
+
+
+class _GoldenBuffer:
+    '''the points of the golden data that are still needed, extended chunk by chunk'''
+    def __init__(self, reader, names, chunk_size):
+        self.chunks = reader.iter_windows(names, chunk_size)
+        self.names = names
+        self.x, self.y = None, None
+        self.first = None
+        self.done = False
+
+    def extend(self):
+        '''append the next chunk, return False when there is none'''
+        if not self.done:
+            try:
+                _, x, values = next(self.chunks)
+            except StopIteration:
+                self.done = True
+                self.chunks.close()
+                return False
+            if self.first is None and len(x):
+                self.first = float(x[0])
+            if self.x is None:
+                self.x, self.y = x, _block(values, self.names)
+            else:
+                self.x = np.concatenate((self.x, x))
+                self.y = np.concatenate((self.y, _block(values, self.names)), axis=1)
+        return not self.done
+
+    def span(self):
+        '''length of the golden sweep (so far, until done)'''
+        return abs(float(self.x[-1]) - self.first) or 1.0
+
+    def drop(self, n):
+        '''forget the first n points'''
+        self.x, self.y = self.x[n:], self.y[:, n:]
+
+    def close(self):
+        self.chunks.close()
+
+
+def compare(golden, new, signals=None, abstol=1e-6, reltol=1e-3, sweeptol=1e-9,
+            fail_fast=False, chunk_size=65536):
+    '''
+    Compare signals (default: all signals present in both) of new against golden
+
+        returns an OrderedDict {name: DiffResult}.
+        The first and last sweep values of both files must agree within
+        sweeptol * (length of the golden sweep), else all results get range_mismatch.
+        The ranges are checked while streaming: the start from the first chunks,
+        the end when one of the files runs out (not checked when the pass stops early).
+        With fail_fast the comparison stops at the first failing signal, the
+        signals that were not completely checked get complete False (passed None).
+    '''
+    if signals is None:
+        golden_signals = golden.get_signals()
+        names = [name for name in new.get_signals() if name in golden_signals]
+    else:
+        names = list(signals)
+    results = OrderedDict((name, DiffResult(name)) for name in names)
+    if not names:
+        return results
+
+    g = _GoldenBuffer(golden, names, chunk_size)
+    while (g.x is None or len(g.x) < 2) and g.extend():
+        pass
+    if g.first is None:
+        g.close()
+        raise PSFReaderError('no sweep points in ' + repr(golden.psf.filename))
+    direction = -1.0 if len(g.x) > 1 and g.x[1] < g.x[0] else 1.0 # allow decreasing sweeps (e.g. DC)
+    lo = g.first * direction
+
+    active = np.arange(len(names)) # rows still being checked
+    max_abs = np.zeros(len(names))
+    max_rel = np.zeros(len(names))
+    n_first = n_last = None
+    at_end = True # the pass reached the end of one of the files
+    stopped = False
+
+    for start, x, values in new.iter_windows(names, chunk_size):
+        if len(x) == 0:
+            continue
+        if n_first is None:
+            n_first = float(x[0])
+        n_last = float(x[-1])
+        xn = x * direction
+
+        # make sure the golden buffer covers this chunk
+        while g.x[-1] * direction < xn[-1] and g.extend():
+            pass
+        hi = g.x[-1] * direction if g.done else np.inf # golden range
+
+        # only compare the overlap with the golden sweep
+        i0, i1 = np.searchsorted(xn, lo, side='left'), np.searchsorted(xn, hi, side='right')
+        if i0 == i1:
+            if n_last * direction - hi > sweeptol * g.span(): # past the end of golden
+                break
+            continue
+        x, xn = x[i0:i1], xn[i0:i1]
+        start += int(i0)
+
+        gx = g.x * direction
+        idx, w = interp_weights(gx, xn)
+        idx1 = np.minimum(idx + 1, len(gx) - 1)
+        g0 = g.y[np.ix_(active, idx)]
+        ref = np.where(w > 0, g0 * (1 - w) + g.y[np.ix_(active, idx1)] * w, g0) # no NaN * 0 from the next point
+        err = np.abs(_block(values, [names[k] for k in active])[:, i0:i1] - ref)
+        mag = np.abs(ref)
+        violations = ~(err <= abstol + reltol * mag) # NaN is a violation
+        failed = violations.any(axis=1)
+        first = np.argmax(violations, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = np.where(mag > 0, err / mag, np.where(err > 0, np.inf, 0.0))
+
+        # statistics up to and including the first violation, fmax skips NaN
+        upto = np.where(failed, first + 1, len(xn))
+        counted = np.arange(len(xn)) < upto[:, None]
+        max_abs[active] = np.fmax(max_abs[active], np.fmax.reduce(np.where(counted, err, 0.0), axis=1))
+        max_rel[active] = np.fmax(max_rel[active], np.fmax.reduce(np.where(counted, rel, 0.0), axis=1))
+        for k, i in zip(active[failed], first[failed]):
+            r = results[names[k]]
+            r.violation = float(x[i])
+            r.index = start + int(i)
+            r.complete = True
+        active = active[~failed]
+        if len(active) == 0 or (fail_fast and failed.any()):
+            stopped = fail_fast and len(active) > 0
+            at_end = False
+            break
+        if n_last * direction - hi > sweeptol * g.span(): # past the end of golden
+            break
+
+        # drop golden points that are no longer needed
+        g.drop(max(np.searchsorted(gx, xn[-1], side='right') - 1, 0))
+
+    if n_first is None:
+        g.close()
+        raise PSFReaderError('no sweep points in ' + repr(new.psf.filename))
+    if at_end: # golden points past the end of new
+        while (g.x[-1] - n_last) * direction <= sweeptol * g.span() and g.extend():
+            pass
+    g.close()
+
+    tol = sweeptol * g.span()
+    mismatch = abs(n_first - g.first) > tol
+    if at_end:
+        mismatch = mismatch or abs(n_last - float(g.x[-1])) > tol
+    for k, r in enumerate(results.values()):
+        r.max_abs = float(max_abs[k])
+        r.max_rel = float(max_rel[k])
+        r.range_mismatch = mismatch
+    if not stopped:
+        for k in active:
+            results[names[k]].complete = True
+    return results
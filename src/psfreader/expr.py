@@ -0,0 +1,341 @@
+'''
+Derived signals: lazy expressions over signal names.
+
+    An expression such as 'v(outp)-v(outn)', 'db20(v(out)/v(in))' or 'i(vdd)*v(vdd)'
+    is parsed into a small graph of Expr nodes. Nothing is read until the expression
+    is evaluated; evaluation streams the VALUE section (see PSFReader.iter_windows),
+    decodes only the operand signals and evaluates the graph chunk by chunk, so all
+    temporaries are chunk sized. Operations write into the temporaries of their
+    operands where possible (ufunc out=), so a chain of operations reuses one buffer.
+    Results are memoized in a bounded LRU cache keyed by file identity (path, size,
+    modification time) and the canonical form of the expression.
+
+    usage:
+        p = PSFReader('filename', lazy=True)
+        gain = p.evaluate('db20(v(out)/v(in))')
+
+        from psfreader.expr import parse
+        vdiff = parse('v(outp)') - parse('v(outn)')
+        p.evaluate(vdiff)
+
+    Names inside v() and i() are taken literally (v(xi0.net<1>), v(in)), bare names
+    outside them must be valid python identifiers.
+    i(name) refers to the terminal current 'name:p', or to name itself when that is
+    already a terminal current (i(m1:d)). A current never resolves to a node voltage.
+'''
+import ast
+import os
+import re
+from collections import OrderedDict
+import numpy as np
+
+from psfreader.psfdata import PSFReaderError
+
+
+def _db(factor):
+    def db(v):
+        m = np.abs(v)
+        if m.dtype.kind != 'f':
+            m = m.astype(float)
+        np.log10(m, out=m)
+        return np.multiply(m, factor, out=m)
+    return db
+
+
+FUNCTIONS = { 'abs'   : np.abs,
+              'mag'   : np.abs,
+              'db10'  : _db(10),
+              'db20'  : _db(20),
+              'phase' : lambda v: np.angle(v, deg=True),
+              'real'  : np.real,
+              'imag'  : np.imag,
+              'conj'  : np.conj,
+              'sqrt'  : np.sqrt,
+              'exp'   : np.exp,
+              'log'   : np.log,
+              'log10' : np.log10 }
+
+OPERATORS = { ast.Add  : ('+', np.add),
+              ast.Sub  : ('-', np.subtract),
+              ast.Mult : ('*', np.multiply),
+              ast.Div  : ('/', np.true_divide),
+              ast.Pow  : ('**', np.power) }
+
+_BINOPS = {symbol: func for symbol, func in OPERATORS.values()}
+
+_FRESH = ('db10', 'db20', 'phase') # functions that return a new array
+
+
+def _apply(func, args, owned):
+    '''
+    apply ufunc func to args, return (result, owned)
+
+        the result is written into an owned argument (a temporary of this
+        evaluation) when that has the dtype and shape of the result
+    '''
+    arrays = [a for a in args if isinstance(a, np.ndarray)]
+    if arrays:
+        shape = np.broadcast(*args).shape
+        probe = [a[:0] if isinstance(a, np.ndarray) and a.ndim else a for a in args]
+        dtype = func(*probe).dtype
+        for a, own in zip(args, owned):
+            if own and a.dtype == dtype and a.shape == shape:
+                return func(*args, out=a), True
+    result = func(*args)
+    return result, isinstance(result, np.ndarray)
+
+
+class Expr:
+    '''base class of the expression graph'''
+    def names(self):
+        '''list of signal names the expression depends on'''
+        return []
+
+    def resolve(self, signals):
+        '''return expression with signal names resolved against the signals dictionary'''
+        return self
+
+    def evaluate(self, values):
+        '''evaluate with values: dictionary {name: array}'''
+        return self._evaluate(values)[0]
+
+    def _evaluate(self, values):
+        '''return (result, owned), owned results are temporaries that may be overwritten'''
+        raise NotImplementedError
+
+    def __repr__(self):
+        return 'Expr({})'.format(self)
+
+    def __add__(self, other):      return BinOp('+', self, _wrap(other))
+    def __radd__(self, other):     return BinOp('+', _wrap(other), self)
+    def __sub__(self, other):      return BinOp('-', self, _wrap(other))
+    def __rsub__(self, other):     return BinOp('-', _wrap(other), self)
+    def __mul__(self, other):      return BinOp('*', self, _wrap(other))
+    def __rmul__(self, other):     return BinOp('*', _wrap(other), self)
+    def __truediv__(self, other):  return BinOp('/', self, _wrap(other))
+    def __rtruediv__(self, other): return BinOp('/', _wrap(other), self)
+    def __pow__(self, other):      return BinOp('**', self, _wrap(other))
+    def __neg__(self):             return BinOp('-', Const(0), self)
+
+
+def _wrap(value):
+    return value if isinstance(value, Expr) else Const(value)
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+    def _evaluate(self, values):
+        return self.value, False
+
+
+class Signal(Expr):
+    '''
+    reference to a signal
+
+        current is True for i(name): resolves to name:p, or to name when it names
+        a terminal (contains ':')
+    '''
+    def __init__(self, name, current=False):
+        self.name = name
+        self.current = current
+
+    def __str__(self):
+        return '{}({!r})'.format('i' if self.current else 'v', self.name)
+
+    def names(self):
+        return [self.name]
+
+    def resolve(self, signals):
+        if not self.current:
+            candidates = [self.name]
+        elif ':' in self.name:
+            candidates = [self.name, self.name + ':p']
+        else:
+            candidates = [self.name + ':p']
+        for name in candidates:
+            if name in signals:
+                return Signal(name)
+        if self.current:
+            raise PSFReaderError('Unknown terminal current: ' + repr(self.name))
+        raise PSFReaderError('Unknown signal: ' + repr(self.name))
+
+    def _evaluate(self, values):
+        return values[self.name], False
+
+
+class BinOp(Expr):
+    def __init__(self, op, a, b):
+        self.op = op
+        self.a = a
+        self.b = b
+
+    def __str__(self):
+        return '({} {} {})'.format(self.a, self.op, self.b)
+
+    def names(self):
+        return self.a.names() + self.b.names()
+
+    def resolve(self, signals):
+        return BinOp(self.op, self.a.resolve(signals), self.b.resolve(signals))
+
+    def _evaluate(self, values):
+        a, own_a = self.a._evaluate(values)
+        b, own_b = self.b._evaluate(values)
+        return _apply(_BINOPS[self.op], (a, b), (own_a, own_b))
+
+
+class Func(Expr):
+    def __init__(self, name, arg):
+        if name not in FUNCTIONS:
+            raise ValueError('Unknown function: ' + repr(name))
+        self.name = name
+        self.arg = arg
+
+    def __str__(self):
+        return '{}({})'.format(self.name, self.arg)
+
+    def names(self):
+        return self.arg.names()
+
+    def resolve(self, signals):
+        return Func(self.name, self.arg.resolve(signals))
+
+    def _evaluate(self, values):
+        arg, owned = self.arg._evaluate(values)
+        func = FUNCTIONS[self.name]
+        if isinstance(func, np.ufunc):
+            return _apply(func, (arg,), (owned,))
+        return func(arg), self.name in _FRESH
+
+
+_QUOTE = re.compile(r'''\b([vViI])\(\s*([^()'"]+?)\s*\)''')
+
+
+def parse(text):
+    '''parse text into an expression graph'''
+    quoted = _QUOTE.sub(lambda m: '{}({!r})'.format(m.group(1), m.group(2)), text.strip())
+    try:
+        tree = ast.parse(quoted, mode='eval')
+    except SyntaxError as e:
+        raise ValueError('Invalid expression: ' + repr(text)) from e
+    return _convert(tree.body, text)
+
+
+def _signal_name(node, text):
+    '''name in v(name): identifier, dotted name or quoted string'''
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return _signal_name(node.value, text) + '.' + node.attr
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    raise ValueError('Invalid signal name in expression: ' + repr(text))
+
+
+def _convert(node, text):
+    if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+        return BinOp(OPERATORS[type(node.op)][0], _convert(node.left, text), _convert(node.right, text))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_convert(node.operand, text)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.UAdd):
+        return _convert(node.operand, text)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, complex)):
+        return Const(node.value)
+    if isinstance(node, (ast.Name, ast.Attribute)):
+        return Signal(_signal_name(node, text))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and len(node.args) == 1 and not node.keywords:
+        func = node.func.id
+        if func in ('v', 'V'):
+            return Signal(_signal_name(node.args[0], text))
+        if func in ('i', 'I'):
+            return Signal(_signal_name(node.args[0], text), current=True)
+        if func in FUNCTIONS:
+            return Func(func, _convert(node.args[0], text))
+    raise ValueError('Unsupported expression: ' + repr(text))
+
+
+class ResultCache:
+    '''
+    LRU cache of evaluated expressions, bounded by the total size (bytes) of the results
+
+        cached arrays are returned read-only as they are shared between callers
+    '''
+    def __init__(self, maxbytes=256 * 2**20):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if value.nbytes > self.maxbytes:
+            return
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key).nbytes
+        value.setflags(write=False)
+        self.entries[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.maxbytes:
+            _, old = self.entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+
+cache = ResultCache()
+
+
+def file_identity(filename):
+    '''key identifying the contents of a file: (path, size, modification time)'''
+    st = os.stat(filename)
+    return (os.path.realpath(filename), st.st_size, st.st_mtime_ns)
+
+
+def evaluate(reader, expr, chunk_size=65536, cache=cache):
+    '''
+    Evaluate expr (string or Expr) on the signals of reader
+
+        the result is looked up in / stored in cache (use cache=None to bypass it)
+    '''
+    if isinstance(expr, str):
+        expr = parse(expr)
+    expr = expr.resolve(reader.get_signals())
+    key = None
+    if cache is not None:
+        key = (file_identity(reader.psf.filename), str(expr))
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    names = list(OrderedDict.fromkeys(expr.names()))
+    if len(reader.psf.sweep_vars) == 0: # no sweep, single values
+        result = np.asarray(expr.evaluate({name: reader.signals[name].val for name in names}))
+    else:
+        result = None
+        npoints = reader.get_header()['PSF sweep points']
+        for start, x, values in reader.iter_windows(names, chunk_size):
+            chunk = expr.evaluate(values)
+            if result is None:
+                result = np.empty(npoints, dtype=np.result_type(chunk))
+            result[start:start + len(x)] = chunk
+        if result is None: # no sweep points
+            result = np.empty(0)
+
+    if key is not None:
+        cache.put(key, result)
+    return result
@@ -0,0 +1,234 @@
+'''
+Streaming measurements on swept PSF data.
+
+    All measurements in a batch are evaluated in a single pass over the VALUE
+    section (see PSFReader.iter_windows), one chunk at a time. The last point of
+    the previous chunk is prepended to every chunk, so interpolated values that
+    straddle a chunk boundary are handled correctly and memory use stays constant.
+
+    usage:
+        from psfreader import PSFReader, Max, RMS, Crossing
+
+        p = PSFReader('filename', lazy=True)
+        r = p.measure({'peak'  : Max('out'),
+                       'rms'   : RMS('out', start=1e-6, stop=2e-6),
+                       't_50'  : Crossing('out', 0.5, edge='rise')})
+        r['t_50']
+'''
+from collections import OrderedDict
+import numpy as np
+
+
+class Measurement:
+    '''
+    Base class of a measurement on one signal over the interval [start, stop] of the sweep.
+
+        the engine calls reset() once, then update(x, y) for every chunk (x is
+        non-decreasing, x[0], y[0] is the last point of the previous chunk except
+        for the first chunk) and finally result().
+        A measurement sets self.done when further data cannot change the result.
+        Measurements with real_only set reject complex signals.
+    '''
+    real_only = False
+
+    def __init__(self, signal, start=None, stop=None):
+        self.signal = signal
+        self.start = -np.inf if start is None else start
+        self.stop = np.inf if stop is None else stop
+        self.reset()
+
+    def __repr__(self):
+        return '{}({!r}, start={}, stop={})'.format(type(self).__name__, self.signal, self.start, self.stop)
+
+    def reset(self):
+        self.done = False
+
+    def update(self, x, y):
+        if x[-1] >= self.stop:
+            self.done = True
+
+    def result(self):
+        raise NotImplementedError
+
+
+def _segments(x, y, start, stop):
+    '''return the linear segments (a, b, ya, yb) of x, y clipped to [start, stop]'''
+    x0, x1, y0, y1 = x[:-1], x[1:], y[:-1], y[1:]
+    if start <= x[0] and x[-1] <= stop: # common case: no clipping needed
+        return x0, x1, y0, y1
+    a = np.maximum(x0, start)
+    b = np.minimum(x1, stop)
+    keep = b > a
+    x0, x1, y0, y1, a, b = x0[keep], x1[keep], y0[keep], y1[keep], a[keep], b[keep]
+    slope = (y1 - y0) / (x1 - x0)
+    return a, b, y0 + (a - x0) * slope, y0 + (b - x0) * slope
+
+
+class _Extreme(Measurement):
+    '''common part of Min and Max: the samples inside [start, stop] and the interpolated end points'''
+    reduce = None
+    real_only = True
+
+    def reset(self):
+        super().reset()
+        self.value = None
+
+    def update(self, x, y):
+        values = [y[(x >= self.start) & (x <= self.stop)]]
+        for bound in (self.start, self.stop):
+            if x[0] < bound < x[-1]:
+                values.append(np.interp([bound], x, y))
+        values = np.concatenate(values)
+        if len(values):
+            v = self.reduce(values)
+            self.value = v if self.value is None else self.reduce([self.value, v])
+        super().update(x, y)
+
+    def result(self):
+        return np.nan if self.value is None else self.value
+
+
+class Min(_Extreme):
+    '''minimum value of signal'''
+    reduce = staticmethod(np.min)
+
+
+class Max(_Extreme):
+    '''maximum value of signal'''
+    reduce = staticmethod(np.max)
+
+
+class Integral(Measurement):
+    '''integral of the (linearly interpolated) signal over the sweep'''
+    def reset(self):
+        super().reset()
+        self.area = 0.0
+        self.span = 0.0
+
+    def update(self, x, y):
+        a, b, ya, yb = _segments(x, y, self.start, self.stop)
+        dx = b - a
+        self.area += np.sum(dx * self.integrand(ya, yb))
+        self.span += np.sum(dx)
+        super().update(x, y)
+
+    @staticmethod
+    def integrand(ya, yb):
+        '''mean value of the quantity over a linear segment from ya to yb'''
+        return (ya + yb) / 2
+
+    def result(self):
+        return self.area
+
+
+class Average(Integral):
+    '''average value of signal (integral divided by the length of the interval)'''
+    def result(self):
+        return self.area / self.span if self.span > 0 else np.nan
+
+
+class RMS(Integral):
+    '''root mean square value of signal'''
+    def update(self, x, y):
+        super().update(x, np.abs(y) if np.iscomplexobj(y) else y)
+
+    @staticmethod
+    def integrand(ya, yb):
+        return (ya * ya + ya * yb + yb * yb) / 3 # exact for a linear segment
+
+    def result(self):
+        return np.sqrt(self.area / self.span) if self.span > 0 else np.nan
+
+
+class Crossing(Measurement):
+    '''
+    sweep value where signal crosses level (linear interpolation)
+
+        edge is 'rise', 'fall' or 'either', occurrence counts from 1,
+        use occurrence='last' for the last crossing in the interval.
+        The result is nan when the crossing is not found.
+    '''
+    real_only = True
+
+    def __init__(self, signal, level, edge='rise', occurrence=1, start=None, stop=None):
+        if edge not in ('rise', 'fall', 'either'):
+            raise ValueError('edge should be rise, fall or either, not ' + repr(edge))
+        if occurrence != 'last' and occurrence < 1:
+            raise ValueError('occurrence should be >= 1 or last, not ' + repr(occurrence))
+        self.level = level
+        self.edge = edge
+        self.occurrence = occurrence
+        super().__init__(signal, start, stop)
+
+    def __repr__(self):
+        return 'Crossing({!r}, {}, edge={!r}, occurrence={!r}, start={}, stop={})'.format(
+                self.signal, self.level, self.edge, self.occurrence, self.start, self.stop)
+
+    def reset(self):
+        super().reset()
+        self.count = 0
+        self.value = np.nan
+
+    def update(self, x, y):
+        d = y - self.level
+        d0, d1 = d[:-1], d[1:]
+        if self.edge == 'rise':
+            ix = np.flatnonzero((d0 < 0) & (d1 >= 0))
+        elif self.edge == 'fall':
+            ix = np.flatnonzero((d0 > 0) & (d1 <= 0))
+        else:
+            ix = np.flatnonzero(((d0 < 0) & (d1 >= 0)) | ((d0 > 0) & (d1 <= 0)))
+        if len(ix):
+            xc = x[ix] - d0[ix] * (x[ix + 1] - x[ix]) / (d1[ix] - d0[ix])
+            xc = xc[(xc >= self.start) & (xc <= self.stop)]
+            if len(xc):
+                if self.occurrence == 'last':
+                    self.value = xc[-1]
+                elif self.count + len(xc) >= self.occurrence:
+                    self.value = xc[self.occurrence - self.count - 1]
+                    self.done = True
+                self.count += len(xc)
+        super().update(x, y)
+
+    def result(self):
+        return self.value
+
+
+def measure(reader, measurements, chunk_size=65536):
+    '''
+    Evaluate a batch of measurements in one streaming pass over reader.
+
+        measurements is a list or a dict of Measurement objects, the results are
+        returned in the same form. Only the signals that are measured are decoded and
+        the pass stops as soon as all measurements are done.
+    '''
+    if isinstance(measurements, dict):
+        keys, items = list(measurements.keys()), list(measurements.values())
+    else:
+        keys, items = None, list(measurements)
+    for m in items:
+        m.reset()
+    names = list(OrderedDict.fromkeys(m.signal for m in items))
+
+    prev_x, prev_y = None, dict()
+    for _, x, values in reader.iter_windows(names, chunk_size):
+        if all(m.done for m in items):
+            break
+        if prev_x is not None:
+            x = np.concatenate(([prev_x], x))
+        for name, y in values.items():
+            if y.dtype.names:
+                raise ValueError('Cannot measure STRUCT signal ' + repr(name))
+            if prev_x is not None:
+                y = np.concatenate(([prev_y[name]], y))
+            values[name] = y
+            prev_y[name] = y[-1]
+        prev_x = x[-1]
+        for m in items:
+            if not m.done:
+                if m.real_only and np.iscomplexobj(values[m.signal]):
+                    raise ValueError('{} cannot measure complex signal {!r}'.format(type(m).__name__, m.signal))
+                m.update(x, values[m.signal])
+
+    results = [m.result() for m in items]
+    return results if keys is None else OrderedDict(zip(keys, results))
@@ -3,6 +3,10 @@ from collections import OrderedDict
 import numpy as np
 
 
+class PSFReaderError(ValueError):
+    pass
+
+
 class TypeId(IntEnum):
     INT8 = 0x01
     STRING = 0x02
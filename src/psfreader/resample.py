@@ -0,0 +1,115 @@
+'''
+Resampling of signals onto a common grid.
+
+    The interpolation indices and weights are computed once from the sweep
+    variable and then applied to all selected signals at once (as one 2D array
+    per chunk), while streaming the VALUE section (see PSFReader.iter_windows).
+
+    usage:
+        p = PSFReader('filename', lazy=True)
+        t = np.linspace(0, 1e-6, 1001)
+        r = p.resample(t, signals=['out', 'vdd'], method='linear')
+        r['out']
+'''
+from collections import OrderedDict
+import numpy as np
+
+from psfreader.psfdata import PSFReaderError
+
+
+METHODS = ('linear', 'hold')
+
+
+def interp_weights(x, grid, method='linear'):
+    '''
+    Return (idx, w) such that y(grid) = y[idx] * (1 - w) + y[idx + 1] * w
+
+        x must be monotonic (increasing or decreasing). Like np.interp, points
+        outside x get the first or last value. For method 'hold' w is 0 and idx is
+        the last point with x <= grid (sample and hold).
+    '''
+    if method not in METHODS:
+        raise ValueError('method should be one of {}, not {!r}'.format(', '.join(METHODS), method))
+    x = np.asarray(x)
+    grid = np.asarray(grid, dtype=float)
+    if len(x) > 1 and x[-1] < x[0]:
+        x, grid = -x, -grid
+    n = len(x)
+    idx = np.searchsorted(x, grid, side='right') - 1
+    if method == 'hold':
+        return np.clip(idx, 0, n - 1), np.zeros(len(grid))
+    idx = np.clip(idx, 0, max(n - 2, 0))
+    if n == 1:
+        return idx, np.zeros(len(grid))
+    x0, x1 = x[idx], x[idx + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = np.where(x1 > x0, (grid - x0) / (x1 - x0), 0.0)
+    return idx, np.clip(w, 0.0, 1.0)
+
+
+def sweep_values(reader):
+    '''the sweep values of reader (streamed when the reader is lazy)'''
+    sweep = reader.get_sweep()
+    if sweep is not None and sweep.val is not None:
+        x = sweep.val
+    else:
+        x = [x for _, x, _ in reader.iter_windows([])]
+        x = np.concatenate(x) if x else np.empty(0)
+    if len(x) == 0:
+        raise PSFReaderError('Cannot resample, the sweep has no points')
+    return x
+
+
+def resample(reader, grid, signals=None, method='linear', chunk_size=None):
+    '''
+    Resample signals (default: all) of reader onto grid
+
+        returns an OrderedDict {name: array}, the arrays are rows of a single
+        (len(signals), len(grid)) array. chunk_size (points per chunk) defaults to
+        keep a chunk of all selected signals around 32 MB.
+    '''
+    if method not in METHODS: # before the pass over the sweep
+        raise ValueError('method should be one of {}, not {!r}'.format(', '.join(METHODS), method))
+    grid = np.asarray(grid, dtype=float)
+    names = list(reader.get_signals()) if signals is None else list(signals)
+    if chunk_size is None:
+        chunk_size = max(1024, 2**22 // max(1, len(names)))
+
+    idx, w = interp_weights(sweep_values(reader), grid, method)
+    npoints = reader.get_header()['PSF sweep points']
+    idx1 = np.minimum(idx + 1, npoints - 1)
+    order = np.argsort(idx, kind='stable') # process grid points in file order
+    idx_sorted = idx[order]
+
+    out = None
+    done = 0  # grid points (in order) that are resampled
+    prev = None
+    for start, x, values in reader.iter_windows(names, chunk_size):
+        stop = start + len(x)
+        for name, y in values.items():
+            if y.dtype.names:
+                raise ValueError('Cannot resample STRUCT signal ' + repr(name))
+        if out is None:
+            dtype = np.result_type(float, *[y.dtype for y in values.values()])
+            out = np.empty((len(names), len(grid)), dtype=dtype)
+        block = np.empty((len(names), len(x) + 1), dtype=out.dtype)
+        for k, y in enumerate(values.values()):
+            block[k, 1:] = y
+        if prev is not None: # last point of previous chunk (global index start - 1)
+            block[:, 0] = prev
+        prev = block[:, -1].copy()
+
+        # grid points that only need samples up to index stop - 1
+        hi = len(idx) if stop >= npoints else np.searchsorted(idx_sorted, stop - 1, side='left')
+        if hi > done:
+            rows = order[done:hi]
+            i0 = idx[rows] - start + 1
+            i1 = idx1[rows] - start + 1
+            if method == 'hold':
+                out[:, rows] = block[:, i0]
+            else:
+                wr = w[rows]
+                out[:, rows] = block[:, i0] * (1 - wr) + block[:, i1] * wr
+            done = hi
+
+    return OrderedDict((name, out[k]) for k, name in enumerate(names))
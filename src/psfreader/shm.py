@@ -0,0 +1,240 @@
+'''
+Publication of decoded signals in shared memory for multi-process consumers.
+
+    The publishing process decodes the file once and copies the sweep and the
+    signals into a single multiprocessing.shared_memory segment. Workers receive
+    a small picklable handle and attach to the segment: the signals are then
+    read-only numpy views on the shared memory, nothing is copied or parsed.
+
+    Within a process a segment is mapped once; all arrays refer to the mapping
+    and it is unmapped when the last array (or SharedPSF) is garbage collected.
+    The segment itself is removed when the publication is closed (or garbage
+    collected) in the publishing process.
+
+    usage:
+        p = PSFReader('filename', lazy=True)
+        with p.share() as pub:
+            pool.map(work, [pub.handle] * n)
+
+        def work(handle):
+            s = handle.attach()
+            y = s.signals['out'].val
+
+    Note: on python < 3.13 processes that are not started by the publishing
+    process (e.g. dask distributed workers) have their own resource tracker,
+    which removes the segment when such a worker exits.
+'''
+import ctypes
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+from multiprocessing.shared_memory import SharedMemory
+
+
+ALIGN = 64 # alignment (bytes) of the arrays in the segment
+
+
+class SharedSignal:
+    '''signal in shared memory: name, val (read-only array) and prop'''
+    def __init__(self, name, val, prop=None):
+        self.name = name
+        self.val = val
+        self.prop = prop
+
+    def __repr__(self):
+        return "Shared({!r}, 'val': ndarray(len: {}, dtype: {}))".format(self.name, self.val.size, self.val.dtype)
+
+
+class SharedPSFHandle:
+    '''
+    picklable reference to a published result
+
+        layout is a list of (name, offset, dtype, shape, prop), the sweep (if any)
+        is the first entry
+    '''
+    def __init__(self, shm_name, header, sweep, layout):
+        self.shm_name = shm_name
+        self.header = header
+        self.sweep = sweep
+        self.layout = layout
+
+    def __repr__(self):
+        return 'SharedPSFHandle({!r}, signals: {})'.format(self.shm_name, len(self.layout))
+
+    def attach(self):
+        '''return a SharedPSF with zero-copy views on the published data'''
+        return SharedPSF(self)
+
+
+class _Mapping:
+    '''
+    a shared memory segment mapped in this process
+
+        arrays are created through __array_interface__ so that they refer to this
+        object (and not export the buffer): the segment stays mapped as long as
+        any array refers to it and is closed when the last one is gone
+    '''
+    def __init__(self, shm_name):
+        try:
+            self.shm = SharedMemory(name=shm_name, track=False)
+        except TypeError: # python < 3.13
+            self.shm = SharedMemory(name=shm_name)
+        c = (ctypes.c_char * self.shm.size).from_buffer(self.shm.buf)
+        self.address = ctypes.addressof(c)
+        del c # release the buffer export, else the segment cannot be closed
+        weakref.finalize(self, self.shm.close)
+
+    def array(self, offset, dtype, shape):
+        return np.asarray(_ArrayInterface(self, self.address + offset, dtype, shape))
+
+
+class _ArrayInterface:
+    def __init__(self, mapping, address, dtype, shape):
+        self.mapping = mapping # keep the mapping alive
+        self.__array_interface__ = { 'version' : 3,
+                                     'data'    : (address, True), # read-only
+                                     'shape'   : tuple(shape),
+                                     'typestr' : dtype.str,
+                                     'descr'   : dtype.descr }
+
+
+_mappings = weakref.WeakValueDictionary() # shm name -> _Mapping
+
+
+def _mapping(shm_name):
+    mapping = _mappings.get(shm_name)
+    if mapping is None:
+        mapping = _mappings[shm_name] = _Mapping(shm_name)
+    return mapping
+
+
+class SharedPSF:
+    '''
+    published result attached in a (worker) process
+
+        offers the read interface of PSFReader: get_header(), get_signals(),
+        get_signal(name), get_sweep()
+    '''
+    def __init__(self, handle):
+        mapping = _mapping(handle.shm_name)
+        self.header = handle.header
+        self.sweep = None
+        self.signals = OrderedDict()
+        for name, offset, dtype, shape, prop in handle.layout:
+            sig = SharedSignal(name, mapping.array(offset, dtype, shape), prop)
+            if handle.sweep is not None and self.sweep is None:
+                self.sweep = sig
+            else:
+                self.signals[name] = sig
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''drop the references to the shared data (arrays still in use remain valid)'''
+        self.sweep = None
+        self.signals = OrderedDict()
+
+    def get_header(self):
+        return dict(self.header)
+
+    def get_signals(self):
+        return self.signals
+
+    def get_signal(self, name):
+        return self.signals[name]
+
+    def get_sweep(self):
+        return self.sweep
+
+
+class SharedPublication:
+    '''
+    owner of the shared memory segment with the published data
+
+        self.handle is passed to the workers. close() (or garbage collection)
+        removes the segment; workers that are attached keep their mapping.
+    '''
+    def __init__(self, reader, signals=None, name=None, chunk_size=65536):
+        all_signals = reader.get_signals()
+        names = list(all_signals) if signals is None else list(signals)
+        variables = [all_signals[name] for name in names]
+        sweep = reader.get_sweep()
+        if sweep is not None:
+            variables.insert(0, sweep)
+        npoints = reader.get_header().get('PSF sweep points', 1)
+
+        layout = []
+        size = 0
+        for var in variables:
+            if var.val is not None:
+                val = np.asarray(var.val)
+                dtype, shape = val.dtype, val.shape
+            else: # lazy reader: streamed into the segment below
+                dtype, shape = np.dtype(var.npdtype), (npoints,)
+            prop = dict(var.prop) if var.prop else None
+            layout.append((var.name, size, dtype, shape, prop))
+            size += (dtype.itemsize * int(np.prod(shape)) + ALIGN - 1) // ALIGN * ALIGN
+
+        self.shm = SharedMemory(name=name, create=True, size=max(size, 1))
+        self._finalizer = weakref.finalize(self, _unlink, self.shm)
+        try:
+            _fill(self.shm, reader, variables, layout, chunk_size, sweep is not None)
+        except BaseException:
+            self.close()
+            raise
+        self.handle = SharedPSFHandle(self.shm.name, reader.get_header(),
+                                      None if sweep is None else sweep.name, layout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''remove the shared memory segment'''
+        self._finalizer()
+
+
+def _fill(shm, reader, variables, layout, chunk_size, has_sweep):
+    '''
+    copy the data of variables into shm (all arrays on shm.buf are released on return)
+
+        when has_sweep the first variable is the sweep, a signal may have the same name
+    '''
+    arrays = [np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+              for (name, offset, dtype, shape, prop) in layout]
+    sweep = None # target of the streamed sweep
+    streamed = OrderedDict() # layout index -> target of a streamed signal
+    for k, (var, a) in enumerate(zip(variables, arrays)):
+        if var.val is not None:
+            a[...] = var.val
+        elif k == 0 and has_sweep:
+            sweep = a
+        else:
+            streamed[k] = a
+    if sweep is not None or streamed:
+        names = list(OrderedDict.fromkeys(variables[k].name for k in streamed))
+        for start, x, values in reader.iter_windows(names, chunk_size):
+            if sweep is not None:
+                sweep[start:start + len(x)] = x
+            for k, a in streamed.items():
+                a[start:start + len(x)] = values[variables[k].name]
+
+
+def _unlink(shm):
+    shm.unlink()
+    try:
+        shm.close()
+    except BufferError: # arrays still alive (e.g. in a traceback), closed when collected
+        pass
+
+
+def publish(reader, signals=None, name=None, chunk_size=65536):
+    '''publish signals (default: all) of reader in shared memory, returns a SharedPublication'''
+    return SharedPublication(reader, signals, name, chunk_size)
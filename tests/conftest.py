@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from psfwriter import write_psf
+
+
+@pytest.fixture(scope='session')
+def sweep():
+    rng = np.random.default_rng(0)
+    return np.cumsum(rng.uniform(0.5, 1.5, 3000)) * 1e-9 # non-uniform timesteps
+
+
+@pytest.fixture(scope='session')
+def signals(sweep):
+    return {'out': np.sin(sweep * 1e7),
+            'in': np.cos(sweep * 1e7),
+            'vdd:p': np.full_like(sweep, 1.2),
+            'vdd': np.full_like(sweep, 1.8)}
+
+
+@pytest.fixture(scope='session', params=[1024, 0], ids=['windowed', 'records'])
+def psffile(request, tmp_path_factory, sweep, signals):
+    '''the same data written in both VALUE layouts'''
+    filename = tmp_path_factory.mktemp('psf') / 'tran.psf'
+    write_psf(filename, sweep, signals, win_size=request.param)
+    return str(filename)
@@ -0,0 +1,86 @@
+'''
+Minimal writer of swept PSF files, used to generate test data.
+
+    Writes the layout that psfreader reads: HEADER, TYPE, SWEEP, TRACE and VALUE
+    sections, followed by the section table, 'Clarissa' and the data size.
+    The VALUE section is either windowed (win_size > 0: DATA blocks holding the
+    sweep and every trace padded to win_size, a ZEROPAD element after the first
+    block) or one record (DATA, id, value) per variable per point.
+'''
+import struct
+import numpy as np
+
+
+def u32(v):
+    return struct.pack('>I', v)
+
+
+def pstr(s):
+    b = s.encode()
+    return u32(len(b)) + b + b'\0' * (((len(b) + 3) & ~3) - len(b))
+
+
+def prop(name, value):
+    if isinstance(value, str):
+        return u32(0x21) + pstr(name) + pstr(value)
+    if isinstance(value, int):
+        return u32(0x22) + pstr(name) + struct.pack('>i', value)
+    return u32(0x23) + pstr(name) + struct.pack('>d', value)
+
+
+def write_psf(filename, x, signals, win_size=0, complex_values=False):
+    '''write sweep x and signals (dict name -> array) to filename'''
+    npoints = len(x)
+    properties = {'PSF sweep points': npoints, 'design': 'test'}
+    if win_size:
+        properties['PSF window size'] = win_size
+    data = b''
+    toc = []
+
+    def section(section_id, body, minor=False):
+        nonlocal data
+        offset = len(data)
+        if minor: # MINOR_SECTION inside the MAJOR_SECTION
+            body = u32(0x16) + u32(offset + 16 + len(body)) + body
+        data += u32(0x15) + u32(offset + 8 + len(body)) + body
+        toc.append((section_id, offset))
+
+    section(0, b''.join(prop(k, v) for k, v in properties.items()))
+    data_type = 0x0c if complex_values else 0x0b
+    section(1, u32(0x10) + u32(1) + pstr('sweep') + u32(0) + u32(0x0b) +
+               u32(0x10) + u32(2) + pstr('sig') + u32(0) + u32(data_type) + prop('units', 'V'),
+            minor=True)
+    section(2, u32(0x10) + u32(10) + pstr('time') + u32(1))
+    names = list(signals)
+    section(3, b''.join(u32(0x10) + u32(100 + k) + pstr(name) + u32(2) for k, name in enumerate(names)),
+            minor=True)
+
+    xs = np.asarray(x, '>f8')
+    dtype, record_size = ('>c16', 16) if complex_values else ('>f8', 8)
+    values = {name: np.asarray(signals[name], dtype) for name in names}
+    body = b''
+    if win_size:
+        i = 0
+        while i < npoints:
+            n = min(win_size // record_size, npoints - i)
+            part = xs[i:i + n].tobytes()
+            body += u32(0x10) + u32(n) + part + b'\0' * (win_size - len(part))
+            for k, name in enumerate(names):
+                part = values[name][i:i + n].tobytes()
+                body += part
+                if k < len(names) - 1: # the last trace is not padded
+                    body += b'\0' * (win_size - len(part))
+            if i == 0:
+                body += u32(0x14) + u32(8) + b'\0' * 8
+            i += n
+    else:
+        for i in range(npoints):
+            body += u32(0x10) + u32(10) + xs[i:i + 1].tobytes()
+            for k, name in enumerate(names):
+                body += u32(0x10) + u32(100 + k) + values[name][i:i + 1].tobytes()
+    section(4, body, minor=True)
+
+    with open(filename, 'wb') as f:
+        f.write(data)
+        f.write(b''.join(u32(s) + u32(o) for s, o in toc))
+        f.write(b'Clarissa' + u32(len(data)))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from psfreader import PSFReader, compare
+from psfwriter import write_psf
+
+
+@pytest.fixture(scope='module')
+def files(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(0.5, 1.5, 1000)) * 1e-9
+    golden = {'a': np.sin(x * 1e7), 'b': np.cos(x * 1e7), 'z': np.zeros_like(x)}
+    d = tmp_path_factory.mktemp('diff')
+    def write(name, x, signals, win_size=1024):
+        filename = str(d / name)
+        write_psf(filename, x, signals, win_size=win_size)
+        return filename
+    nan = {k: v.copy() for k, v in golden.items()}
+    nan['a'][400:] = np.nan
+    off = {k: v.copy() for k, v in golden.items()}
+    off['b'][10] += 1
+    off['z'][20] = 1
+    x2 = np.linspace(x[0], x[-1], 1500) # other timesteps
+    return { 'golden' : write('golden.psf', x, golden),
+             'records': write('records.psf', x, golden, win_size=0),
+             'nan'    : write('nan.psf', x, nan),
+             'half'   : write('half.psf', x[:500], {k: v[:500] for k, v in golden.items()}),
+             'late'   : write('late.psf', x[500:], {k: v[500:] for k, v in golden.items()}),
+             'reversed': write('reversed.psf', x[::-1], {k: v[::-1] for k, v in golden.items()}),
+             'off'    : write('off.psf', x, off),
+             'resampled': write('resampled.psf', x2, {k: np.interp(x2, x, v) for k, v in golden.items()}) }
+
+
+def diff(files, golden, new, chunk_size=64, **kw):
+    return compare(PSFReader(files[golden], lazy=True), PSFReader(files[new], lazy=True), chunk_size=chunk_size, **kw)
+
+
+def test_identical(files):
+    r = diff(files, 'golden', 'records')
+    assert all(v.passed is True and v.max_abs == 0 for v in r.values())
+
+
+def test_other_timesteps(files):
+    r = diff(files, 'golden', 'resampled', abstol=1e-9, reltol=0)
+    assert all(v.passed is True for v in r.values())
+
+
+def test_violation(files):
+    r = diff(files, 'golden', 'off', abstol=1e-3)
+    assert r['a'].passed is True
+    assert r['b'].passed is False and r['b'].index == 10 and type(r['b'].index) is int
+    assert r['z'].index == 20 and r['z'].max_rel == np.inf
+
+
+@pytest.mark.parametrize('golden, new', [('golden', 'nan'), ('nan', 'golden')])
+def test_nan_fails(files, golden, new):
+    r = diff(files, golden, new)
+    assert r['a'].passed is False and r['a'].index == 400
+    assert r['b'].passed is True
+
+
+@pytest.mark.parametrize('chunk_size', [1, 64])
+@pytest.mark.parametrize('golden, new', [('golden', 'half'), ('half', 'golden'), ('late', 'golden')])
+def test_truncated_fails(files, golden, new, chunk_size):
+    r = diff(files, golden, new, chunk_size=chunk_size)
+    for v in r.values():
+        assert v.passed is False and v.range_mismatch and v.violation is None
+
+
+def test_fail_fast(files):
+    r = diff(files, 'golden', 'nan', signals=['a', 'b'], fail_fast=True)
+    assert r['a'].passed is False
+    assert r['b'].passed is None and not r['b'].complete
+
+
+def test_decreasing_sweep(files):
+    r = diff(files, 'reversed', 'reversed', chunk_size=1)
+    assert all(v.passed is True for v in r.values())
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from psfreader import PSFReader, PSFReaderError, expr
+from psfwriter import write_psf
+
+
+def test_evaluate(psffile, signals):
+    p = PSFReader(psffile, lazy=True)
+    out, inp = signals['out'], signals['in']
+    assert np.allclose(p.evaluate('v(out)-v(in)', chunk_size=100, cache=None), out - inp)
+    assert np.allclose(p.evaluate('db20(v(out)/v(in))', cache=None), 20 * np.log10(np.abs(out / inp)))
+    assert np.allclose(p.evaluate('i(vdd)*v(vdd)', cache=None), 1.2 * 1.8) # i(vdd) -> vdd:p
+    assert np.allclose(p.evaluate('i(vdd:p)', cache=None), 1.2)
+    assert np.allclose(p.evaluate(-expr.parse('out') * 2 + 1, cache=None), -2 * out + 1)
+
+
+def test_signal_data_not_modified(psffile, signals):
+    p = PSFReader(psffile)
+    p.evaluate('((v(out)+v(in))*2-1)/3', cache=None)
+    assert np.array_equal(p.signals['out'].val, signals['out'])
+    assert np.array_equal(p.signals['in'].val, signals['in'])
+
+
+def test_cache(psffile):
+    p = PSFReader(psffile, lazy=True)
+    cache = expr.ResultCache()
+    a = p.evaluate('v(out)*2', cache=cache)
+    assert p.evaluate('2*v(out)', cache=cache) is not a
+    assert p.evaluate(' v(out) * 2', cache=cache) is a
+    assert not a.flags.writeable
+
+
+def test_cache_bound():
+    cache = expr.ResultCache(maxbytes=3 * 8000)
+    for k in range(5):
+        cache.put(k, np.zeros(1000))
+    assert list(cache.entries) == [2, 3, 4]
+
+
+def test_errors(psffile):
+    p = PSFReader(psffile, lazy=True)
+    with pytest.raises(PSFReaderError):
+        p.evaluate('v(nope)')
+    with pytest.raises(PSFReaderError): # a current never resolves to a voltage
+        p.evaluate('i(out)')
+    for text in ['v(out', 'foo(out)', 'v(out)[0]', '__import__("os")']:
+        with pytest.raises(ValueError):
+            expr.parse(text)
+
+
+def test_empty_sweep(tmp_path):
+    filename = str(tmp_path / 'empty.psf')
+    write_psf(filename, np.zeros(0), {'out': np.zeros(0)}, win_size=1024)
+    p = PSFReader(filename, lazy=True)
+    cache = expr.ResultCache()
+    assert len(p.evaluate('v(out)*2', cache=cache)) == 0
+    assert len(p.evaluate('v(out)*2', cache=cache)) == 0
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from psfreader import PSFReader, Min, Max, Average, RMS, Integral, Crossing
+from psfwriter import write_psf
+
+trapezoid = getattr(np, 'trapezoid', None) or np.trapz # numpy < 2.0
+
+
+def first_crossing(x, y, level, n):
+    d = y - level
+    i = np.flatnonzero((d[:-1] < 0) & (d[1:] >= 0))[n - 1]
+    return x[i] - d[i] * (x[i + 1] - x[i]) / (d[i + 1] - d[i])
+
+
+@pytest.mark.parametrize('chunk_size', [7, 65536])
+def test_measurements(psffile, sweep, signals, chunk_size):
+    x, y = sweep, signals['out']
+    t0, t1 = x[100] * 1.0003, x[2000] * 0.9997 # between sample points
+    p = PSFReader(psffile, lazy=True)
+    r = p.measure({'max': Max('out'),
+                   'min': Min('out', t0, t1),
+                   'avg': Average('out', t0, t1),
+                   'rms': RMS('out'),
+                   'int': Integral('in'),
+                   'cross': Crossing('out', 0.3, 'rise', 2),
+                   'last': Crossing('out', 0.3, 'either', 'last')}, chunk_size=chunk_size)
+
+    inside = (x >= t0) & (x <= t1)
+    assert r['max'] == y.max()
+    assert r['min'] == min(y[inside].min(), np.interp(t0, x, y), np.interp(t1, x, y))
+    g = np.linspace(t0, t1, 1000001)
+    assert np.isclose(r['avg'], trapezoid(np.interp(g, x, y), g) / (t1 - t0), rtol=1e-6)
+    g = np.linspace(x[0], x[-1], 2000001)
+    assert np.isclose(r['rms'], np.sqrt(trapezoid(np.interp(g, x, y)**2, g) / (x[-1] - x[0])), rtol=1e-5)
+    assert np.isclose(r['int'], trapezoid(signals['in'], x))
+    assert np.isclose(r['cross'], first_crossing(x, y, 0.3, 2))
+    assert x[-200] < r['last'] < x[-1]
+
+
+def test_crossing_not_found(psffile):
+    p = PSFReader(psffile, lazy=True)
+    assert np.isnan(p.measure([Crossing('vdd', 5.0)])[0])
+
+
+def test_complex_rejected(tmp_path):
+    x = np.linspace(1, 1e6, 100)
+    filename = str(tmp_path / 'ac.psf')
+    write_psf(filename, x, {'out': 1 / (1 + 1j * x / 1e3)}, win_size=512, complex_values=True)
+    p = PSFReader(filename, lazy=True)
+    assert np.isfinite(p.measure([RMS('out')])[0])
+    for m in (Max('out'), Min('out'), Crossing('out', 0.5)):
+        with pytest.raises(ValueError):
+            p.measure([m])
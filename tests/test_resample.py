@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from psfreader import PSFReader, PSFReaderError
+from psfwriter import write_psf
+
+
+@pytest.mark.parametrize('chunk_size', [1, 100, None])
+def test_resample(psffile, sweep, signals, chunk_size):
+    p = PSFReader(psffile, lazy=True)
+    rng = np.random.default_rng(1)
+    grid = rng.uniform(sweep[0] - 1e-8, sweep[-1] + 1e-8, 2000) # unsorted, outside the sweep
+    r = p.resample(grid, chunk_size=chunk_size)
+    for name, val in signals.items():
+        assert np.allclose(r[name], np.interp(grid, sweep, val))
+    r = p.resample(grid, ['out'], method='hold', chunk_size=chunk_size)
+    i = np.clip(np.searchsorted(sweep, grid, side='right') - 1, 0, None)
+    assert np.array_equal(r['out'], signals['out'][i])
+
+
+def test_unknown_method(psffile):
+    p = PSFReader(psffile, lazy=True)
+    with pytest.raises(ValueError):
+        p.resample([0.0], method='cubic')
+
+
+def test_empty_sweep(tmp_path):
+    filename = str(tmp_path / 'empty.psf')
+    write_psf(filename, np.zeros(0), {'out': np.zeros(0)}, win_size=1024)
+    for lazy in (True, False):
+        with pytest.raises(PSFReaderError):
+            PSFReader(filename, lazy=lazy).resample([0.0, 1.0])
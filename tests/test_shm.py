@@ -0,0 +1,37 @@
+import gc
+import pickle
+import numpy as np
+
+from psfreader import PSFReader
+from psfreader import shm
+from psfwriter import write_psf
+
+
+def test_publish_attach(psffile, sweep, signals):
+    with PSFReader(psffile, lazy=True).share() as pub:
+        handle = pickle.loads(pickle.dumps(pub.handle))
+        s = handle.attach()
+        assert np.array_equal(s.get_sweep().val, sweep)
+        for name, val in signals.items():
+            assert np.array_equal(s.signals[name].val, val)
+        assert not s.signals['out'].val.flags.writeable
+
+        val = handle.attach().signals['vdd'].val # the SharedPSF is a temporary
+        gc.collect()
+        assert np.all(val == 1.8)
+        del s, val
+        gc.collect()
+        assert handle.shm_name not in shm._mappings
+
+
+def test_signal_named_like_sweep(tmp_path):
+    filename = str(tmp_path / 'time.psf')
+    x = np.linspace(0, 1e-6, 300)
+    write_psf(filename, x, {'time': 2 * x, 'out': x}, win_size=1024)
+    for lazy in (True, False):
+        with PSFReader(filename, lazy=lazy).share() as pub:
+            s = pub.handle.attach()
+            assert np.array_equal(s.get_sweep().val, x)
+            assert np.array_equal(s.signals['time'].val, 2 * x)
+            assert np.array_equal(s.signals['out'].val, x)
+            s.close()
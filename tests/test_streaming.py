@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from psfreader import PSFReader, PSFReaderError
+
+
+def test_full_load(psffile, sweep, signals):
+    p = PSFReader(psffile)
+    assert np.array_equal(p.get_sweep().val, sweep)
+    assert list(p.signals) == list(signals)
+    for name, val in signals.items():
+        assert np.array_equal(p.signals[name].val, val)
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+@pytest.mark.parametrize('chunk_size', [1, 100, 65536])
+def test_iter_windows_equals_full_load(psffile, lazy, chunk_size):
+    full = PSFReader(psffile)
+    p = PSFReader(psffile, lazy=lazy)
+    names = ['vdd', 'out'] # subset, not in file order
+    chunks = list(p.iter_windows(names, chunk_size))
+    starts = [start for start, _, _ in chunks]
+    assert starts == list(np.cumsum([0] + [len(x) for _, x, _ in chunks])[:-1])
+    assert np.array_equal(np.concatenate([x for _, x, _ in chunks]), full.get_sweep().val)
+    for name in names:
+        assert np.array_equal(np.concatenate([v[name] for _, _, v in chunks]), full.signals[name].val)
+        assert chunks[0][2][name].dtype.isnative
+
+
+def test_lazy_does_not_load(psffile):
+    p = PSFReader(psffile, lazy=True)
+    assert p.signals['out'].val is None
+
+
+def test_unknown_signal(psffile):
+    p = PSFReader(psffile, lazy=True)
+    with pytest.raises(PSFReaderError):
+        list(p.iter_windows(['nope']))